@@ -4,7 +4,7 @@ inference_auto.py
 
 Automatically processes ALL scenarios:
   • Finds every <name>_history_events.csv + <name>_model.pkl
-  • Predicts BUY signals, fetches entry_price + entry_time
+  • Predicts BUY signals for recent events, fetches entry_price + entry_time
   • Saves signals_<name>_<YYYY-MM-DD>.csv per scenario
   • Uploads each to Drive under DRIVE_FOLDER_ID
   • Sends each as a Telegram document with a caption of the signals
@@ -13,15 +13,24 @@ Automatically processes ALL scenarios:
 
 import os
 import glob
-import math
-from datetime import datetime, timedelta
+import asyncio
+import time
+from datetime import timedelta
+import numpy as np
 import pandas as pd
 import joblib
-import requests
+import aiohttp
 import yfinance as yf
+from yfinance.exceptions import YFException
+from numba import njit
+from sklearn.linear_model import LogisticRegression
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaInMemoryUpload
+
+# Copy-on-Write is always on from pandas 3; opt in explicitly before that
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # ── CONFIG ────────────────────────────────────────────────────────────
 SERVICE_ACCOUNT_JSON = os.environ['SERVICE_ACCOUNT_JSON']
@@ -31,6 +40,15 @@ TELEGRAM_CHAT_ID     = os.environ['TELEGRAM_CHAT_ID']
 SERVICE_JSON         = 'service_account.json'
 OUTPUT_BASE          = 'daily_signals'
 ENTRY_WINDOW_HOURS   = 8  # how many hours from event to suggest entry window
+CACHE_DIR            = 'signal_cache'
+CACHE_TTL_HOURS      = float(os.environ.get('CACHE_TTL_HOURS', 20))
+# Only events this many days old or newer are scored; older ones are stale
+SCORING_WINDOW_DAYS  = int(os.environ.get('SCORING_WINDOW_DAYS', 3))
+
+# Close series already downloaded this run, keyed by (symbol, start, end)
+_HIST_CACHE = {}
+# Loaded models, keyed by path
+_MODEL_CACHE = {}
 
 
 # ── DRIVE INITIALIZATION ──────────────────────────────────────────────
@@ -44,29 +62,207 @@ def init_drive():
     return build('drive', 'v3', credentials=creds)
 
 
-# ── FEATURE HELPERS ────────────────────────────────────────────────────
-def compute_pct_return(symbol, ts):
-    try:
-        hist = yf.Ticker(symbol).history(
-            start=ts.date() - timedelta(days=2),
-            end=ts.date() + timedelta(days=1)
-        )['Close']
-        if len(hist) >= 2:
-            return (hist.iloc[-1] - hist.iloc[-2]) / hist.iloc[-2]
-    except:
-        pass
-    return 0.0
-
-
-def fetch_price(symbol, ts):
+def upload_to_drive(drive_svc, path, csv_bytes):
+    meta  = {'name': os.path.basename(path), 'parents': [DRIVE_FOLDER_ID]}
+    media = MediaInMemoryUpload(csv_bytes, mimetype='text/csv', resumable=False)
+    drive_svc.files().create(body=meta, media_body=media).execute()
+
+
+# ── PRICE DOWNLOAD ─────────────────────────────────────────────────────
+def download_closes(symbols, start, end):
+    """
+    Fetch daily closes for all symbols in a single batched yfinance call.
+    Returns a date-indexed frame with one column per symbol.
+    """
+    symbols = list(symbols)
     try:
-        hist = yf.Ticker(symbol).history(
-            start=ts.date() - timedelta(days=2),
-            end=ts.date() + timedelta(days=1)
-        )['Close']
-        return float(hist.iloc[-1])
-    except:
+        # Only 'Close' is used, so skip yfinance's adjustment/actions work
+        data = yf.download(
+            symbols, start=start, end=end,
+            group_by='ticker', threads=True, progress=False,
+            auto_adjust=False, back_adjust=False, actions=False, prepost=False
+        )
+    except (OSError, YFException):
+        # requests' and curl_cffi's network errors are both OSErrors
+        return pd.DataFrame()
+    if data is None or data.empty:
+        return pd.DataFrame()
+    if not isinstance(data.columns, pd.MultiIndex):
+        data.columns = pd.MultiIndex.from_product([symbols, data.columns])
+    closes = data.xs('Close', axis=1, level=1)
+    if closes.index.tz is not None:
+        closes.index = closes.index.tz_localize(None)
+    return closes
+
+
+def _cache_path(symbol, start, end):
+    return os.path.join(CACHE_DIR, f"{symbol}_{start}_{end}.parquet")
+
+
+def _read_cache(symbol, start, end):
+    """Close series from CACHE_DIR, or None if absent or older than the TTL."""
+    path = _cache_path(symbol, start, end)
+    if not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > CACHE_TTL_HOURS * 3600:
         return None
+    return pd.read_parquet(path)['Close']
+
+
+def _write_cache(close, symbol, start, end):
+    """Write via a temp file so an interrupted run can't leave a torn file."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(symbol, start, end)
+    tmp  = f"{path}.tmp"
+    close.to_frame('Close').to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def _prune_cache():
+    """Delete cache files that have outlived the TTL."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if time.time() - os.path.getmtime(path) > CACHE_TTL_HOURS * 3600:
+            os.remove(path)
+
+
+def _history(symbols, start, end):
+    """
+    Same as download_closes, but serves symbols already fetched for this
+    window from _HIST_CACHE or CACHE_DIR and only downloads the rest.
+    Fresh downloads go to _HIST_CACHE, and to CACHE_DIR once the window
+    has closed.
+    """
+    _prune_cache()
+    missing = []
+    for s in symbols:
+        if (s, start, end) in _HIST_CACHE:
+            continue
+        cached = _read_cache(s, start, end)
+        if cached is None:
+            missing.append(s)
+        else:
+            _HIST_CACHE[(s, start, end)] = cached
+
+    if missing:
+        closes = download_closes(missing, start, end)
+        # end is exclusive: only a window that stops before today's session
+        # is final. One reaching into today may still gain or revise bars.
+        today    = pd.Timestamp.now(tz='UTC').tz_localize(None).normalize()
+        complete = pd.Timestamp(end) <= today
+        for s in closes.columns:
+            _HIST_CACHE[(s, start, end)] = closes[s]
+            # Don't persist tickers Yahoo returned nothing for
+            if complete and closes[s].notna().any():
+                _write_cache(closes[s], s, start, end)
+    return pd.DataFrame({
+        s: _HIST_CACHE[(s, start, end)]
+        for s in symbols if (s, start, end) in _HIST_CACHE
+    })
+
+
+# ── FEATURE HELPERS ────────────────────────────────────────────────────
+@njit(cache=True)
+def _segment_pct(offsets, closes, days):
+    """
+    For each symbol's run closes[offsets[i]:offsets[i+1]], the change from
+    the previous close and that close's day (NaN / NaT at the run start).
+    """
+    pct  = np.empty(closes.shape[0])
+    prev = np.empty(days.shape[0], dtype=np.int64)
+    for i in range(offsets.shape[0] - 1):
+        start, end = offsets[i], offsets[i + 1]
+        if start < end:
+            pct[start]  = np.nan
+            prev[start] = np.iinfo(np.int64).min  # NaT
+        for k in range(start + 1, end):
+            pct[k]  = (closes[k] - closes[k - 1]) / closes[k - 1]
+            prev[k] = days[k - 1]
+    return pct, prev
+
+
+def window_features(events, closes):
+    """
+    pct_return and entry_price for every event in one vectorised pass.
+    Both come from the closes between two days before the event and the
+    event date: pct_return from the last two (0.0 if there aren't two),
+    entry_price from the last one (NaN if there are none).
+    """
+    prices = (
+        closes.rename_axis('date').reset_index()
+        .melt(id_vars='date', var_name='symbol', value_name='close')
+        .dropna(subset=['close'])
+        .sort_values(['symbol', 'date'])
+    )
+    prices['date']   = prices['date'].astype('datetime64[ns]')
+    prices['symbol'] = prices['symbol'].astype(events['symbol'].dtype)
+
+    sym     = prices['symbol'].to_numpy()
+    offsets = np.append(
+        np.flatnonzero(np.r_[True, sym[1:] != sym[:-1]]), len(sym)
+    )
+    pct, prev = _segment_pct(
+        offsets,
+        prices['close'].to_numpy(dtype=np.float64),
+        prices['date'].to_numpy().view(np.int64)
+    )
+    prices['pct']       = pct
+    prices['prev_date'] = prev.view('datetime64[ns]')
+
+    ev = pd.DataFrame({
+        'symbol': events['symbol'],
+        'day': events['event_timestamp'].dt.tz_localize(None)
+                                        .dt.normalize()
+                                        .astype('datetime64[ns]'),
+    }).dropna()
+    window = timedelta(days=2)
+    merged = pd.merge_asof(
+        ev.reset_index().sort_values('day'),
+        prices.sort_values('date'),
+        left_on='day', right_on='date', by='symbol',
+        direction='backward', tolerance=pd.Timedelta(window)
+    ).set_index('index')
+
+    pct = merged['pct'].where(merged['prev_date'] >= merged['day'] - window)
+    return pd.DataFrame({
+        'pct_return':  pct.reindex(events.index).fillna(0.0),
+        'entry_price': merged['close'].reindex(events.index),
+    })
+
+
+# ── PREDICTION ─────────────────────────────────────────────────────────
+def load_model(model_path):
+    """
+    Load each model once per run. Its numpy arrays are memory-mapped
+    from the page cache rather than copied into fresh allocations.
+    """
+    if model_path not in _MODEL_CACHE:
+        _MODEL_CACHE[model_path] = joblib.load(model_path, mmap_mode='r')
+    return _MODEL_CACHE[model_path]
+
+
+@njit(cache=True)
+def _linear_predict(x, coef, intercept):
+    out = np.empty(x.shape[0], dtype=np.int8)
+    for i in range(x.shape[0]):
+        z = intercept
+        for j in range(x.shape[1]):
+            z += x[i, j] * coef[j]
+        out[i] = 1 if z > 0 else 0
+    return out
+
+
+def predict_signals(model, X):
+    """
+    model.predict(X) for a float64 ndarray X. Binary LogisticRegression
+    models skip sklearn's input validation and run a compiled kernel.
+    """
+    if isinstance(model, LogisticRegression) and len(model.classes_) == 2:
+        idx = _linear_predict(X, model.coef_[0], model.intercept_[0])
+        return model.classes_[idx]
+    return model.predict(X)
 
 
 # ── EXIT REMINDER STUB ────────────────────────────────────────────────
@@ -83,106 +279,173 @@ def schedule_exit_reminder(symbol, entry_ts, scenario_name):
 
 
 # ── PER-SCENARIO PROCESSING ────────────────────────────────────────────
-def process_scenario(name, csv_path, model_path, drive_svc):
-    # 1) Load raw events
-    df = pd.read_csv(csv_path, header=0, names=['DateRaw','Ticker'])
-    df = df.rename(columns={'Ticker': 'symbol'})
-    df['event_timestamp'] = pd.to_datetime(
-        df['DateRaw'], format='%Y-%m-%d', errors='coerce', utc=True
+def load_events(csv_path, cutoff):
+    """Raw events on or after cutoff, with tz-aware UTC timestamps."""
+    df = pd.read_csv(
+        csv_path, header=0, names=['event_timestamp','symbol'],
+        dtype={'symbol': 'string'},
+        parse_dates=['event_timestamp'], date_format='%Y-%m-%d'
     )
+    ts = df['event_timestamp']
+    if not pd.api.types.is_datetime64_dtype(ts):
+        # A malformed date makes read_csv leave the whole column unparsed
+        ts = pd.to_datetime(ts, format='%Y-%m-%d', errors='coerce')
+    df['event_timestamp'] = ts.dt.tz_localize('UTC')
+    # yfinance returns upper-case tickers; match them for the lookups
+    df['symbol'] = df['symbol'].str.strip().str.upper()
+    # Older events are stale; don't spend price lookups on them
+    return df[df['event_timestamp'] >= cutoff]
 
-    # 2) Predict BUY signals
-    model = joblib.load(model_path)
-    df['pct_return'] = df.apply(
-        lambda r: compute_pct_return(r['symbol'], r['event_timestamp']),
-        axis=1
-    )
-    df['signal'] = model.predict(df[['pct_return']])
-    buys = df[df['signal'] == 1].copy()
-    if buys.empty:
+
+def process_scenario(name, df, model_path, closes, now):
+    if df.empty:
         return None
 
-    # 3) Fetch entry prices
-    buys['entry_price'] = buys.apply(
-        lambda r: fetch_price(r['symbol'], r['event_timestamp']), axis=1
-    )
+    # 1) Predict BUY signals
+    model = load_model(model_path)
+    df = df.join(window_features(df, closes))
+    X = df[['pct_return']].to_numpy(dtype=np.float64, copy=False)
+    df['signal'] = predict_signals(model, X)
+    buys = df.loc[df['signal'] == 1, ['symbol','entry_price','event_timestamp']]
+    if buys.empty:
+        return None
 
-    # 4) Save to CSV
-    date_str = datetime.utcnow().strftime('%Y-%m-%d')
+    # 2) Save to CSV
+    date_str = now.strftime('%Y-%m-%d')
     folder   = os.path.join(OUTPUT_BASE, name)
     os.makedirs(folder, exist_ok=True)
     out_csv  = os.path.join(folder, f"{name}_signals_{date_str}.csv")
-    buys[['symbol','entry_price','event_timestamp']].to_csv(out_csv, index=False)
+    # Serialise once; the same bytes go to disk, Drive and Telegram
+    csv_bytes = buys.to_csv(index=False).encode()
+    with open(out_csv, 'wb') as f:
+        f.write(csv_bytes)
 
-    # 5) Upload to Drive
-    meta  = {'name': os.path.basename(out_csv), 'parents': [DRIVE_FOLDER_ID]}
-    media = MediaFileUpload(out_csv, mimetype='text/csv')
-    drive_svc.files().create(body=meta, media_body=media).execute()
-
-    return out_csv, buys
+    return out_csv, csv_bytes, buys
 
 
 # ── TELEGRAM NOTIFICATION ─────────────────────────────────────────────
-def send_telegram(file_path, buys, scenario_name):
-    now      = datetime.utcnow()
+def format_caption(buys, scenario_name, now):
+    """Header plus a single-line bullet per signal, with green‐prefixed numbers."""
     date_hdr = now.strftime('%d/%m/%y')
-    if not buys.empty:
-        # Build a single-line bullet per signal, with green‐prefixed numbers
-        caption = f"🟢 Scenario: {scenario_name} | BUY Signals {date_hdr} GMT:\n"
-        for _, r in buys.iterrows():
-            p    = r['entry_price']
-            # Calculate entry window
-            delta = r['event_timestamp'] - now
-            hrs   = max(0, math.ceil(delta.total_seconds() / 3600))
-            caption += (
-                f"• BUY | Entry Price: 🟢{p if p is not None else 'N/A'} | "
-                f"Enter within: 🟢{hrs} hours\n"
-            )
-            # Schedule your exit reminder (stub)
-            schedule_exit_reminder(r['symbol'], r['event_timestamp'], scenario_name)
-
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-        with open(file_path, 'rb') as f:
-            requests.post(
-                url,
-                params={'chat_id': TELEGRAM_CHAT_ID, 'caption': caption},
-                files={'document': f}
-            )
-    else:
-        # No signals for this scenario
-        requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
-            data={'chat_id': TELEGRAM_CHAT_ID,
-                  'text': f"✅ No BUY signals for {scenario_name} today."}
+    caption  = f"🟢 Scenario: {scenario_name} | BUY Signals {date_hdr} GMT:\n"
+    price = buys['entry_price'].astype(str).where(
+        buys['entry_price'].notna(), 'N/A'
+    )
+    # Calculate entry window
+    secs = (buys['event_timestamp'] - now).dt.total_seconds()
+    hrs  = np.ceil(secs / 3600).clip(lower=0).fillna(0).astype(int)
+    lines = (
+        "• BUY | Entry Price: 🟢" + price
+        + " | Enter within: 🟢" + hrs.astype(str) + " hours\n"
+    )
+    return caption + "".join(lines)
+
+
+async def _check_response(resp, what):
+    if resp.status != 200:
+        raise RuntimeError(
+            f"Telegram {what} failed: HTTP {resp.status} {await resp.text()}"
         )
 
 
+async def send_message(session, text):
+    async with session.post(
+        f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
+        data={'chat_id': TELEGRAM_CHAT_ID, 'text': text}
+    ) as resp:
+        await _check_response(resp, "sendMessage")
+
+
+async def send_telegram_async(session, file_path, csv_bytes, buys,
+                              scenario_name, now):
+    caption = format_caption(buys, scenario_name, now)
+
+    # Schedule your exit reminder (stub)
+    for symbol, event_ts in buys[['symbol','event_timestamp']].itertuples(
+        index=False, name=None
+    ):
+        schedule_exit_reminder(symbol, event_ts, scenario_name)
+
+    form = aiohttp.FormData()
+    form.add_field('chat_id', TELEGRAM_CHAT_ID)
+    form.add_field('caption', caption)
+    form.add_field('document', csv_bytes,
+                   filename=os.path.basename(file_path),
+                   content_type='text/csv')
+    async with session.post(
+        f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument",
+        data=form
+    ) as resp:
+        await _check_response(resp, "sendDocument")
+
+
+async def notify_all(signals, now):
+    """
+    Post every scenario's signals concurrently over one session, or a
+    single message if no scenario had any. A failed send is logged and
+    does not cancel the others.
+    """
+    async with aiohttp.ClientSession() as session:
+        labels = [name for name, _ in signals]
+        sends  = [
+            send_telegram_async(session, file_path, csv_bytes, buys, name, now)
+            for name, (file_path, csv_bytes, buys) in signals
+        ]
+        if not signals:
+            labels.append("no-signal summary")
+            sends.append(send_message(
+                session, "✅ No BUY signals in any scenario today."
+            ))
+        results = await asyncio.gather(*sends, return_exceptions=True)
+
+    failed = 0
+    for label, result in zip(labels, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"⚠️  Telegram send for '{label}' failed: {result}")
+    return failed
+
+
 # ── MAIN ───────────────────────────────────────────────────────────────
 def main():
-    drive = init_drive()
-    any_signals = False
+    drive  = init_drive()
+    now    = pd.Timestamp.now(tz='UTC')  # one clock read for the whole run
+    today  = now.normalize()
+    cutoff = today - timedelta(days=SCORING_WINDOW_DAYS)
 
+    scenarios = []
     for csv_path in glob.glob("*_history_events.csv"):
         name       = os.path.basename(csv_path).replace("_history_events.csv", "")
         model_path = f"{name}_model.pkl"
         if not os.path.exists(model_path):
             print(f"⚠️  Skipping '{name}': missing model.")
             continue
+        scenarios.append((name, load_events(csv_path, cutoff), model_path))
 
-        res = process_scenario(name, csv_path, model_path, drive)
+    # Every scenario scores the same window, so a single batched download
+    # of all their symbols serves them all
+    symbols = sorted(set().union(
+        *(df['symbol'].dropna() for _, df, _ in scenarios)
+    ))
+    closes = _history(
+        symbols,
+        start=cutoff.date() - timedelta(days=2),
+        end=today.date() + timedelta(days=1)
+    ) if symbols else pd.DataFrame()
+
+    signals = []
+    for name, df, model_path in scenarios:
+        res = process_scenario(name, df, model_path, closes, now)
         if res:
-            file_path, buys = res
-            send_telegram(file_path, buys, name)
-            any_signals = True
+            file_path, csv_bytes, _ = res
+            upload_to_drive(drive, file_path, csv_bytes)
+            signals.append((name, res))
         else:
             print(f"ℹ️  No BUY signals for '{name}' today.")
 
-    if not any_signals:
-        requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
-            data={'chat_id': TELEGRAM_CHAT_ID,
-                  'text': "✅ No BUY signals in any scenario today."}
-        )
+    failed = asyncio.run(notify_all(signals, now))
+    if failed:
+        raise SystemExit(f"❌ {failed} Telegram send(s) failed.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+for var in ('SERVICE_ACCOUNT_JSON', 'DRIVE_FOLDER_ID',
+            'TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID'):
+    os.environ.setdefault(var, 'test')
+
+import inference_auto as ia  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOW  = pd.Timestamp('2026-10-15 09:00', tz='UTC')
+DAYS = pd.bdate_range('2026-10-05', '2026-10-15')
+
+
+def fake_download(days):
+    """Mimics yf.download over days: tickers come back upper-cased."""
+    def download(tickers, start=None, end=None, **kwargs):
+        frames = {}
+        for i, t in enumerate(tickers):
+            close = pd.Series(100.0 + i + np.arange(len(days)), index=days)
+            close = close[(close.index >= pd.Timestamp(start))
+                          & (close.index < pd.Timestamp(end))]
+            frames[t.upper()] = pd.DataFrame({'Open': close, 'Close': close})
+        return pd.concat(frames, axis=1)
+    return download
+
+
+@pytest.fixture
+def days():
+    return DAYS
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, days):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ia.yf, 'download', fake_download(days))
+    monkeypatch.setattr(ia, '_HIST_CACHE', {})
+    return tmp_path
+
+
+def test_lower_case_symbols_get_prices(workdir):
+    (workdir / 'X_history_events.csv').write_text(
+        'Date,Ticker\n2026-10-14,aapl\n2026-10-13,msft\n'
+    )
+    cutoff = NOW.normalize() - pd.Timedelta(days=3)
+    df     = ia.load_events('X_history_events.csv', cutoff)
+    closes = ia._history(df['symbol'].unique(),
+                         DAYS[0].date(), DAYS[-1].date())
+    res = ia.process_scenario(
+        'X', df, os.path.join(ROOT, 'BuyBack_model.pkl'), closes, NOW
+    )
+    assert res is not None
+    buys = res[-1]
+    assert list(buys['symbol']) == ['AAPL', 'MSFT']
+    assert buys['entry_price'].notna().all()
+
+
+TODAY = pd.Timestamp.now(tz='UTC').tz_localize(None).normalize()
+
+
+# Bars up to yesterday, as at the 08:00 UTC run before today's session
+@pytest.mark.parametrize('days', [pd.date_range(TODAY - pd.Timedelta(days=5),
+                                                TODAY - pd.Timedelta(days=1))])
+def test_cache_keeps_only_closed_windows_and_prunes_expired(workdir):
+    start = (TODAY - pd.Timedelta(days=5)).date()
+    os.makedirs(ia.CACHE_DIR)
+    stale = os.path.join(ia.CACHE_DIR, 'OLD_2020-01-01_2020-01-02.parquet')
+    open(stale, 'w').close()
+    os.utime(stale, (0, 0))
+
+    ia._history(['AAPL'], start, TODAY.date())
+    # Last bar is yesterday, but the window still covers today's session
+    ia._history(['MSFT'], start, (TODAY + pd.Timedelta(days=1)).date())
+
+    files = os.listdir(ia.CACHE_DIR)
+    assert not os.path.exists(stale)
+    assert [f for f in files if f.startswith('AAPL_')]
+    assert not [f for f in files if f.startswith('MSFT_')]
+    assert not [f for f in files if f.endswith('.tmp')]
+
+
+def test_interrupted_cache_write_leaves_no_file(workdir, monkeypatch):
+    def torn(self, path):
+        open(path, 'w').write('PAR1')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', torn)
+    with pytest.raises(KeyboardInterrupt):
+        ia._write_cache(pd.Series([1.0], index=DAYS[:1]), 'AAPL',
+                        DAYS[0].date(), DAYS[1].date())
+    assert ia._read_cache('AAPL', DAYS[0].date(), DAYS[1].date()) is None
+
+
+def test_signals_csv_on_disk_matches_uploaded_bytes(workdir):
+    (workdir / 'X_history_events.csv').write_text(
+        'Date,Ticker\n2026-10-14,AAPL\n2026-10-13,GONE\n'
+    )
+    df     = ia.load_events('X_history_events.csv',
+                            NOW.normalize() - pd.Timedelta(days=3))
+    closes = ia._history(['AAPL'], DAYS[0].date(), DAYS[-1].date())
+    out_csv, csv_bytes, buys = ia.process_scenario(
+        'X', df, os.path.join(ROOT, 'BuyBack_model.pkl'), closes, NOW
+    )
+    assert csv_bytes.decode() == buys.to_csv(index=False)
+    with open(out_csv, 'rb') as f:
+        assert f.read() == csv_bytes
+
+
+class _Resp:
+    def __init__(self, status):
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def text(self):
+        return 'Bad Request'
+
+
+class _Session:
+    """Answers each post with the next status in replies, or raises it."""
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.posts   = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def post(self, url, data=None):
+        self.posts.append(url.rsplit('/', 1)[-1])
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return _Resp(reply)
+
+
+BUYS = pd.DataFrame({'symbol': ['AAPL'], 'entry_price': [1.0],
+                     'event_timestamp': [NOW.normalize()]})
+
+
+def test_failed_send_does_not_cancel_the_rest(monkeypatch, capsys):
+    session = _Session(ConnectionError('reset by peer'), 400, 200)
+    monkeypatch.setattr(ia.aiohttp, 'ClientSession', lambda: session)
+    signals = [(name, (f'{name}.csv', b'csv', BUYS)) for name in 'ABC']
+
+    failed = ia.asyncio.run(ia.notify_all(signals, NOW))
+
+    assert session.posts == ['sendDocument'] * 3
+    assert failed == 2
+    out = capsys.readouterr().out
+    assert "'A' failed: reset by peer" in out
+    assert "'B' failed: Telegram sendDocument failed: HTTP 400" in out
+
+
+def test_no_signal_message_only_when_nothing_fired(monkeypatch):
+    session = _Session(200)
+    monkeypatch.setattr(ia.aiohttp, 'ClientSession', lambda: session)
+    assert ia.asyncio.run(ia.notify_all([], NOW)) == 0
+    assert session.posts == ['sendMessage']
+
+
+@pytest.mark.parametrize('labels', [(0, 1), (-1, 3), ('hold', 'buy')])
+def test_linear_fast_path_matches_predict(tmp_path, monkeypatch, labels):
+    rng = np.random.default_rng(0)
+    X   = rng.normal(size=(200, 1))
+    y   = np.where(X[:, 0] + rng.normal(scale=0.5, size=200) > 0.1,
+                   labels[1], labels[0])
+    path = str(tmp_path / 'lr_model.pkl')
+    joblib.dump(LogisticRegression().fit(X, y), path)
+
+    monkeypatch.setattr(ia, '_MODEL_CACHE', {})
+    m = ia.load_model(path)
+    assert list(m.classes_) == sorted(labels)
+    np.testing.assert_array_equal(ia.predict_signals(m, X), m.predict(X))
+
+
+def test_segment_pct_restarts_at_every_symbol():
+    # Runs: three rows, an empty run, one row, two rows
+    offsets = np.array([0, 3, 3, 4, 6])
+    closes  = np.array([10.0, 11.0, 12.1, 5.0, 2.0, 3.0])
+    days    = np.arange(6, dtype=np.int64) * 86_400 * 10**9
+    pct, prev = ia._segment_pct(offsets, closes, days)
+
+    np.testing.assert_array_equal(
+        pct, [np.nan, 0.1, (12.1 - 11.0) / 11.0, np.nan, np.nan, 0.5]
+    )
+    nat = np.iinfo(np.int64).min
+    np.testing.assert_array_equal(
+        prev, [nat, days[0], days[1], nat, nat, days[4]]
+    )
+
+    pct, prev = ia._segment_pct(np.array([0]), np.empty(0),
+                                np.empty(0, dtype=np.int64))
+    assert pct.shape == prev.shape == (0,)
+
+
+def _events(symbols, days):
+    return pd.DataFrame({
+        'event_timestamp': pd.DatetimeIndex(days).tz_localize('UTC'),
+        'symbol': pd.array(symbols, dtype='string'),
+    })
+
+
+def test_window_features_without_prices():
+    events = _events(['AAPL', 'MSFT'], DAYS[-2:])
+    feats  = ia.window_features(events, pd.DataFrame())
+    assert (feats['pct_return'] == 0.0).all()
+    assert feats['entry_price'].isna().all()
+
+
+def test_window_features_match_per_event_windows():
+    """Same values, bit for bit, as slicing each event's own window."""
+    rng    = np.random.default_rng(1)
+    dates  = pd.date_range('2026-09-01', '2026-10-15')
+    closes = pd.DataFrame(
+        rng.uniform(50, 150, size=(len(dates), 4)),
+        index=dates, columns=['A', 'B', 'C', 'D']
+    )
+    closes = closes.mask(rng.random(closes.shape) < 0.4)  # gaps
+    closes['D'] = np.nan                                  # no data at all
+    closes.iloc[-1, 0] = np.nan
+    events = _events(rng.choice(['A', 'B', 'C', 'D', 'E'], 300),
+                     rng.choice(dates, 300))
+
+    feats = ia.window_features(events, closes)
+
+    for i, (ts, sym) in events[['event_timestamp', 'symbol']].iterrows():
+        day  = ts.tz_localize(None)
+        hist = closes.reindex(columns=[sym])[sym].dropna()
+        hist = hist[(hist.index >= day - pd.Timedelta(days=2))
+                    & (hist.index < day + pd.Timedelta(days=1))]
+        pct  = ((hist.iloc[-1] - hist.iloc[-2]) / hist.iloc[-2]
+                if len(hist) >= 2 else 0.0)
+        assert feats.at[i, 'pct_return'] == pct
+        if len(hist):
+            assert feats.at[i, 'entry_price'] == hist.iloc[-1]
+        else:
+            assert np.isnan(feats.at[i, 'entry_price'])